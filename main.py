@@ -6,10 +6,19 @@ Fully integrated version: ATM option selection, trading, risk management, heartb
 import os
 import sys
 import time
+import queue
+import random
+import sqlite3
+import threading
 import traceback
 import schedule
 import requests
-from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from functools import lru_cache
+from datetime import date, datetime, timedelta, timezone
 from typing import List, Optional
 from alpaca_trade_api import REST, TimeFrame
 
@@ -19,7 +28,9 @@ from alpaca_trade_api import REST, TimeFrame
 API_KEY = os.getenv("APCA_API_KEY_ID")
 API_SECRET = os.getenv("APCA_API_SECRET_KEY")
 BASE_URL = os.getenv("APCA_API_BASE_URL", "https://paper-api.alpaca.markets")
+OPTIONS_CONTRACTS_URL = "https://paper-api.alpaca.markets/v2/options/contracts"
 DISCORD_WEBHOOK_URL = os.getenv("DISCORD_WEBHOOK_URL")
+STATE_DB_PATH = os.getenv("OPTIONS_STATE_DB", "options_state.sqlite")
 
 RISK_PER_TRADE = 0.02
 STOP_LOSS_PCT = 0.35
@@ -29,10 +40,41 @@ MIN_VOLUME = 1_000_000
 MIN_OPTION_VOLUME = 50
 MIN_OPTION_PRICE = 0.50
 MIN_DAYS_TO_EXPIRY = 3
+CONTRACTS_LIMIT = 50
+OPTION_STRIKE_BAND = 0.20
+SYMBOL_FAILURE_LIMIT = 5
+SYMBOL_FAILURE_WINDOW = 3600
+BARS_LOOKBACK_DAYS = 7
+BARS_BATCH_SIZE = 200
 
 MAX_RETRIES = 3
 INITIAL_RETRY_SLEEP = 3
+RETRY_BACKOFF_CAP = 30
+RETRY_AFTER_CAP = 60
+NON_RETRYABLE_STATUS = {400, 401, 403, 404, 422}
+OVERLOAD_STATUS = {429, 500, 502, 503, 504}
+AIMD_START = 4
+AIMD_MIN = 1
+AIMD_MAX = 32
+ALPACA_LATENCY_TARGET = 3.0
+ALPACA_RATE_LIMIT = 180
+ALPACA_RATE_PERIOD = 60
+BREAKER_FAILURES = 5
+BREAKER_COOLDOWN = 30
 TRADE_INTERVAL_MINUTES = 30
+RISK_INTERVAL_MINUTES = 5
+SCHEDULER_MAX_SLEEP = 60
+SCAN_WORKERS = 16
+ORDER_WORKERS = 8
+CLOCK_CACHE_SECONDS = 60
+POSITIONS_CACHE_SECONDS = 10
+DISCORD_BATCH_WINDOW = 0.5
+DISCORD_BATCH_MAX = 10
+DISCORD_MIN_INTERVAL = 0.2
+DISCORD_QUEUE_MAX = 1024
+DISCORD_CONTENT_MAX = 1900
+SHUTDOWN_FLUSH_TIMEOUT = 2
+ALERT_TRACE_FRAMES = 20
 
 # Hardcoded top 30 tickers for testing
 HARDCODED_TICKERS = [
@@ -45,145 +87,547 @@ HARDCODED_TICKERS = [
 # ALPACA CLIENT
 # -------------------------
 api = REST(API_KEY, API_SECRET, BASE_URL)
+# The SDK's session keeps requests' default 10-connection pool per host, smaller than the
+# number of calls the AIMD gate can have in flight, so surplus connections were dropped and
+# re-handshaken. Size it to the gate; retries stay with safe_api_call.
+api._session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=AIMD_MAX, max_retries=0))
+# The SDK otherwise sleeps APCA_RETRY_WAIT inside the call on 429/504 before retrying,
+# which hides the throttle from safe_api_call and reads as a slow response to the gate.
+api._retry = 0
+
+# -------------------------
+# HTTP SESSION
+# -------------------------
+# One pooled session for raw REST calls so TCP/TLS connections are reused.
+# Alpaca credentials are passed per request rather than set on the session.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_connections=32, pool_maxsize=64, max_retries=0))
+ALPACA_HEADERS = {"APCA-API-KEY-ID": API_KEY, "APCA-API-SECRET-KEY": API_SECRET}
+
+# Webhook posts get their own small pool with transport-level retries: Discord 429s
+# carry Retry-After, which urllib3 honors, and a lost notification is worse than a late one.
+DISCORD_SESSION = requests.Session()
+DISCORD_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=1,
+    pool_maxsize=4,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    ),
+))
 
 # -------------------------
 # STATE
 # -------------------------
 purchased_options = set()
+_clock_cache = {"until": 0.0, "val": False}
+_positions_cache = {"until": 0.0, "val": []}
+_cash_budget = {"remaining": 0.0}
+_cash_lock = threading.Lock()
+_symbol_failures = {}
+_symbol_failures_lock = threading.Lock()
+
+_state_lock = threading.Lock()
+
+# Purchases are persisted so a restart doesn't re-buy contracts we already hold.
+_state_db = {"conn": None}
+_state_db_lock = threading.Lock()
+
+def _state_conn() -> sqlite3.Connection:
+    # Opened on first use rather than at import. Callers hold _state_db_lock, since the
+    # connection is shared between order workers.
+    if _state_db["conn"] is None:
+        conn = sqlite3.connect(STATE_DB_PATH, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS purchased_options (symbol TEXT PRIMARY KEY)")
+        conn.commit()
+        _state_db["conn"] = conn
+    return _state_db["conn"]
+
+def claim_purchase(symbol: str) -> bool:
+    # Atomic check-and-add, so two order workers can never both submit the same contract.
+    with _state_lock:
+        if symbol in purchased_options:
+            return False
+        purchased_options.add(symbol)
+        return True
+
+def release_purchase(symbol: str) -> None:
+    with _state_lock:
+        purchased_options.discard(symbol)
+
+def record_purchase(symbol: str) -> None:
+    with _state_lock:
+        purchased_options.add(symbol)
+        _positions_cache["until"] = 0.0
+    # The disk write takes its own lock, so claim_purchase() never waits behind a commit.
+    with _state_db_lock:
+        conn = _state_conn()
+        with conn:
+            conn.execute("INSERT OR IGNORE INTO purchased_options (symbol) VALUES (?)", (symbol,))
+
+def reserve_cash(amount: float) -> bool:
+    # Order workers all size off one get_account() snapshot per cycle; reserving against it
+    # locally keeps the cycle's combined buys within the cash that snapshot reported.
+    with _cash_lock:
+        if amount > _cash_budget["remaining"]:
+            return False
+        _cash_budget["remaining"] -= amount
+        return True
+
+def release_cash(amount: float) -> None:
+    with _cash_lock:
+        _cash_budget["remaining"] += amount
+
+def sync_held_options(tag: str) -> None:
+    # Fold open option positions into the set, covering fills the local state never saw.
+    try:
+        positions = get_positions_cached()
+        purchased_options.update(p.symbol for p in positions if getattr(p, "asset_class", "") == "option")
+    except Exception as e:
+        print(f"[{tag}] Failed to list positions: {e}")
+
+def load_purchased_options() -> None:
+    with _state_db_lock:
+        rows = _state_conn().execute("SELECT symbol FROM purchased_options").fetchall()
+    purchased_options.update(row[0] for row in rows)
+    sync_held_options("StateLoad")
+    print(f"[StateLoad] {len(purchased_options)} option symbols already purchased")
 
 # -------------------------
 # DISCORD HELPERS
 # -------------------------
-def send_discord_message(message: str, critical: bool = False) -> None:
-    if not DISCORD_WEBHOOK_URL:
-        print("[Discord] webhook not set; skipping message.")
-        return
-    payload = {"content": ("@here\n" if critical else "") + message}
+_discord_q: "queue.Queue[str]" = queue.Queue(maxsize=DISCORD_QUEUE_MAX)
+
+_discord_rate = {"last": 0.0}
+_discord_rate_lock = threading.Lock()
+
+def _post_discord(payload: dict) -> None:
+    # Both the message and alert workers post here; keep them under Discord's ~5 req/s.
+    with _discord_rate_lock:
+        wait = _discord_rate["last"] + DISCORD_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        _discord_rate["last"] = time.monotonic()
     try:
-        resp = requests.post(DISCORD_WEBHOOK_URL, json=payload, timeout=6)
+        resp = DISCORD_SESSION.post(DISCORD_WEBHOOK_URL, json=payload, timeout=6)
         if resp.status_code not in (200, 204):
             print(f"[Discord] non-2xx response: {resp.status_code}: {resp.text}")
     except Exception as e:
         print(f"[Discord] send error: {e}")
 
-def send_critical_alert(title: str, exc: Optional[BaseException] = None) -> None:
-    try:
-        trace = ""
-        if exc:
-            tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
-            trace = f"\n```{tb[-1800:]}```"
-        else:
-            tb = "".join(traceback.format_stack())
+def _discord_worker() -> None:
+    # Collapse bursts (e.g. a cycle's worth of fills) into one webhook call: wait up to
+    # DISCORD_BATCH_WINDOW after the first message, or until DISCORD_BATCH_MAX are queued.
+    while True:
+        batch = [_discord_q.get()]
+        deadline = time.monotonic() + DISCORD_BATCH_WINDOW
+        while len(batch) < DISCORD_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_discord_q.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Discord rejects content over 2000 chars, so a large batch goes out in several posts.
+        chunk = ""
+        for msg in batch:
+            msg = msg[:DISCORD_CONTENT_MAX]
+            if chunk and len(chunk) + 1 + len(msg) > DISCORD_CONTENT_MAX:
+                _post_discord({"content": chunk})
+                chunk = ""
+            chunk = f"{chunk}\n{msg}" if chunk else msg
+        _post_discord({"content": chunk})
+        for _ in batch:
+            _discord_q.task_done()
+
+threading.Thread(target=_discord_worker, name="discord-worker", daemon=True).start()
+
+def send_discord_message(message: str, critical: bool = False) -> None:
+    if not DISCORD_WEBHOOK_URL:
+        print("[Discord] webhook not set; skipping message.")
+        return
+    if critical:
+        _post_discord({"content": ("@here\n" + message)[:DISCORD_CONTENT_MAX]})
+        return
+    # Webhooks are fire-and-forget: hand off to the worker so trading never waits on Discord.
+    # If Discord is down long enough to fill the queue, drop the oldest message.
+    while True:
+        try:
+            _discord_q.put_nowait(message)
+            return
+        except queue.Full:
+            try:
+                _discord_q.get_nowait()
+                _discord_q.task_done()
+            except queue.Empty:
+                pass
+
+_alert_q: "queue.Queue[tuple]" = queue.Queue()
+
+def _alert_worker() -> None:
+    # Traceback formatting and the @here post happen here, off the failing job's thread.
+    while True:
+        title, exc, stack, ts = _alert_q.get()
+        try:
+            if exc:
+                tb = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__, limit=-ALERT_TRACE_FRAMES))
+            else:
+                tb = "".join(traceback.format_list(stack))
             trace = f"\n```{tb[-1800:]}```"
-        send_discord_message(f"🔥 CRITICAL: {title} at {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%SZ}{trace}", critical=True)
-    except Exception as e:
-        print(f"[CriticalAlertError] {e}")
+            send_discord_message(f"🔥 CRITICAL: {title} at {ts:%Y-%m-%d %H:%M:%SZ}{trace}", critical=True)
+        except Exception as e:
+            print(f"[CriticalAlertError] {e}")
+        finally:
+            _alert_q.task_done()
+
+threading.Thread(target=_alert_worker, name="alert-worker", daemon=True).start()
+
+def send_critical_alert(title: str, exc: Optional[BaseException] = None) -> None:
+    # Without an exception, the caller's stack has to be captured here, before handing off.
+    # Only the innermost frames survive the 1800-char cut, so only those are captured.
+    stack = None if exc else traceback.extract_stack(limit=ALERT_TRACE_FRAMES + 1)[:-1]
+    _alert_q.put((title, exc, stack, datetime.now(timezone.utc)))
+
+def flush_notifications(timeout: float = SHUTDOWN_FLUSH_TIMEOUT) -> None:
+    # The workers are daemon threads; give queued alerts and messages a bounded chance
+    # to go out before the process exits.
+    deadline = time.monotonic() + timeout
+    while _alert_q.unfinished_tasks or _discord_q.unfinished_tasks:
+        if time.monotonic() >= deadline:
+            print("[Discord] shutdown flush timed out; some messages were not sent.")
+            return
+        time.sleep(0.05)
+
+# -------------------------
+# CONCURRENCY CONTROL
+# -------------------------
+class AimdGate:
+    # Caps in-flight Alpaca calls across the scan and order pools. The cap grows by 0.5
+    # per fast success and halves on throttling, 5xx, timeouts or slow responses, so it
+    # settles near whatever throughput the account's rate limit actually allows. Only
+    # calls started after the last cut can cut again: a burst of failures from requests
+    # that were already in flight is one congestion event, not one per failure.
+    def __init__(self, start: float, c_min: float, c_max: float, latency_target: float):
+        self.limit = start
+        self.c_min = c_min
+        self.c_max = c_max
+        self.latency_target = latency_target
+        self._in_flight = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+        return time.monotonic()
+
+    def release(self, started: float, overloaded: bool = False) -> None:
+        now = time.monotonic()
+        with self._cond:
+            self._in_flight -= 1
+            if overloaded or now - started > self.latency_target:
+                if started > self._last_cut:
+                    self.limit = max(self.c_min, self.limit * 0.5)
+                    self._last_cut = now
+            else:
+                self.limit = min(self.c_max, self.limit + 0.5)
+            self._cond.notify_all()
+
+class TokenBucket:
+    # Proactive client-side limit, set a little under Alpaca's 200 req/min, so the pools
+    # are paced before the server starts answering 429.
+    def __init__(self, rate: int, per: float):
+        self.capacity = rate
+        self.refill_rate = rate / per
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.refill_rate
+            time.sleep(wait)
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+class CircuitBreaker:
+    # Keyed per circuit (the wrapped function's name unless the caller names one). After
+    # `threshold` consecutive overload failures the circuit fails fast for `cooldown`
+    # seconds; then a single caller is let through as the probe while the rest keep
+    # failing fast. One more failure re-opens it and a success closes it.
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._opened_at = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+    def check(self, key: str) -> None:
+        with self._lock:
+            opened_at = self._opened_at.get(key)
+            if opened_at is None:
+                return
+            if time.monotonic() - opened_at < self.cooldown or key in self._probing:
+                raise CircuitOpenError(f"{key}: circuit open after {self._failures[key]} failures")
+            self._probing.add(key)
+
+    def record(self, key: str, ok: bool) -> None:
+        with self._lock:
+            self._probing.discard(key)
+            if ok:
+                self._failures.pop(key, None)
+                self._opened_at.pop(key, None)
+                return
+            self._failures[key] = self._failures.get(key, 0) + 1
+            if self._failures[key] >= self.threshold:
+                self._opened_at[key] = time.monotonic()
+
+alpaca_gate = AimdGate(AIMD_START, AIMD_MIN, AIMD_MAX, ALPACA_LATENCY_TARGET)
+alpaca_bucket = TokenBucket(ALPACA_RATE_LIMIT, ALPACA_RATE_PERIOD)
+alpaca_breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+
+def _http_status(exc: BaseException) -> Optional[int]:
+    # Works for both alpaca APIError and requests.HTTPError, which expose .response.
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+def _outcome_unknown(exc: BaseException) -> bool:
+    # A 5xx, timeout or dropped connection may arrive after the request was processed;
+    # a 4xx (429 included) means it was not.
+    status = _http_status(exc)
+    return status is None or status >= 500
+
+def _is_overload(exc: BaseException) -> bool:
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+        return True
+    return _http_status(exc) in OVERLOAD_STATUS
 
 # -------------------------
 # SAFE API CALLS / BACKOFF
 # -------------------------
-def safe_api_call(fn, *args, max_retries=MAX_RETRIES, initial_sleep=INITIAL_RETRY_SLEEP, **kwargs):
+def _retry_delay(exc: BaseException, prev_sleep: float, base: float) -> float:
+    # Honor a throttled response's Retry-After (or Alpaca's X-RateLimit-Reset epoch) so
+    # pooled workers wait out the limit window instead of hammering it; otherwise use
+    # decorrelated jitter so concurrent workers throttled together don't retry in lockstep.
+    response = getattr(exc, "response", None)
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        reset_at = response.headers.get("X-RateLimit-Reset") if response.status_code == 429 else None
+        try:
+            if retry_after:
+                return min(max(float(retry_after), 0), RETRY_AFTER_CAP)
+            if reset_at:
+                return min(max(float(reset_at) - time.time(), 0), RETRY_AFTER_CAP)
+        except ValueError:
+            pass
+    return min(RETRY_BACKOFF_CAP, random.uniform(base, prev_sleep * 3))
+
+def safe_api_call(fn, *args, max_retries=MAX_RETRIES, initial_sleep=INITIAL_RETRY_SLEEP,
+                  circuit=None, **kwargs):
+    circuit = circuit or fn.__name__
     sleep = initial_sleep
     for attempt in range(1, max_retries + 1):
+        alpaca_breaker.check(circuit)
+        alpaca_bucket.acquire()
+        started = alpaca_gate.acquire()
         try:
-            return fn(*args, **kwargs)
+            result = fn(*args, **kwargs)
+            alpaca_gate.release(started)
+            alpaca_breaker.record(circuit, ok=True)
+            return result
         except Exception as e:
+            overloaded = _is_overload(e)
+            alpaca_gate.release(started, overloaded=overloaded)
+            # Any answer other than an overload means the endpoint is up.
+            alpaca_breaker.record(circuit, ok=not overloaded)
+            if _http_status(e) in NON_RETRYABLE_STATUS:
+                print(f"[NoRetry] {fn.__name__} failed: {e}")
+                raise
             print(f"[Retry {attempt}/{max_retries}] {fn.__name__} failed: {e}")
             if attempt == max_retries:
                 raise
+            sleep = _retry_delay(e, sleep, initial_sleep)
             time.sleep(sleep)
-            sleep *= 2
 
 # -------------------------
 # MARKET STATUS / DATA HELPERS
 # -------------------------
 def is_market_open() -> bool:
+    # Open/closed only flips at the clock's next_open/next_close, so the answer is
+    # reused until then; CLOCK_CACHE_SECONDS is the fallback when those are missing.
+    if time.time() < _clock_cache["until"]:
+        return _clock_cache["val"]
     try:
         clock = safe_api_call(api.get_clock)
-        return getattr(clock, "is_open", False)
+        is_open = getattr(clock, "is_open", False)
+        transition = getattr(clock, "next_close" if is_open else "next_open", None)
+        until = transition.timestamp() if transition is not None else time.time() + CLOCK_CACHE_SECONDS
+        _clock_cache.update(until=until, val=is_open)
+        return is_open
     except Exception as e:
         print(f"[ClockError] {e}")
         return False
 
-def fetch_bars_with_backoff(symbol: str, timeframe: TimeFrame, limit: int = 5):
-    try:
-        bars = safe_api_call(api.get_bars, symbol, timeframe, limit=limit)
-        df = getattr(bars, "df", None) or bars
-        import pandas as pd
-        if df is not None and hasattr(df, "index"):
-            df.index = pd.to_datetime(df.index).tz_localize('UTC', ambiguous='NaT', nonexistent='NaT')
-        return df
-    except Exception as e:
-        print(f"[DataFetch] Max retries exceeded for {symbol} bars: {e}")
-        return None
+def get_positions_cached(ttl: float = POSITIONS_CACHE_SECONDS) -> list:
+    # One list_positions snapshot shared by startup seeding and manage_risk; fills and
+    # stop-loss sells reset it so a stale list is never acted on.
+    now = time.time()
+    if now < _positions_cache["until"]:
+        return _positions_cache["val"]
+    positions = safe_api_call(api.list_positions)
+    _positions_cache.update(until=now + ttl, val=positions)
+    return positions
+
+def fetch_latest_closes(symbols: List[str]) -> dict:
+    # One multi-symbol request per BARS_BATCH_SIZE symbols instead of a get_bars per ticker.
+    # A multi-symbol `limit` caps the total bar count, so bound the query by date instead.
+    start = (datetime.now(timezone.utc).date() - timedelta(days=BARS_LOOKBACK_DAYS)).isoformat()
+    closes = {}
+    for i in range(0, len(symbols), BARS_BATCH_SIZE):
+        chunk = symbols[i:i + BARS_BATCH_SIZE]
+        try:
+            bars = safe_api_call(api.get_bars, chunk, TimeFrame.Day, start=start)
+        except Exception as e:
+            print(f"[DataFetch] Max retries exceeded for batched bars ({chunk[0]}..{chunk[-1]}): {e}")
+            continue
+        # Bars come back ordered by symbol then time, so the last one per symbol wins.
+        closes.update((bar.S, float(bar.c)) for bar in bars)
+    return closes
 
 # -------------------------
 # OPTIONS API
 # -------------------------
-def fetch_option_contracts_with_backoff(symbol: str):
-    BASE_URL_OPTS = "https://paper-api.alpaca.markets/v2/options/contracts"
-    headers = {"APCA-API-KEY-ID": API_KEY, "APCA-API-SECRET-KEY": API_SECRET}
-    params = {"symbol": symbol, "limit": 50}
-
-    sleep = INITIAL_RETRY_SLEEP
-    for attempt in range(1, MAX_RETRIES + 1):
+@lru_cache(maxsize=256)
+def _parse_iso(s: str) -> date:
+    # Every strike on a chain shares a handful of expiries, so most lookups are cache hits.
+    return date.fromisoformat(s)
+
+@dataclass(slots=True)
+class OptionContract:
+    symbol: str
+    option_type: str
+    strike: float
+    exp_date: date
+    volume: int
+    last_price: float
+    order_price: float
+
+def _normalize(c: dict) -> Optional[OptionContract]:
+    # Resolve each field (and its fallbacks) once so selection and ordering only read
+    # plain attributes. Filters prefer the last trade; orders are sized off the ask.
+    exp_date_str = c.get("expiration_date")
+    symbol = c.get("symbol")
+    if not exp_date_str or not symbol:
+        return None
+    last_trade, ask = c.get("last_trade_price"), c.get("ask_price")
+    return OptionContract(
+        symbol=symbol,
+        option_type=(c.get("option_type") or "").lower(),
+        strike=float(c.get("strike_price") or 0),
+        exp_date=_parse_iso(exp_date_str),
+        volume=int(c.get("volume") or 0),
+        last_price=float(last_trade or ask or 0),
+        order_price=float(ask or last_trade or 0),
+    )
+
+def fetch_option_contracts_with_backoff(symbol: str, underlying_price: float, min_valid_date: date):
+    # Chains carry volume and prices, so they are fetched fresh each cycle. A symbol whose
+    # chain was rejected SYMBOL_FAILURE_LIMIT times in a row is skipped until
+    # SYMBOL_FAILURE_WINDOW has passed since the last rejection, then probed again.
+    with _symbol_failures_lock:
+        failures, last_failure = _symbol_failures.get(symbol, (0, 0.0))
+    if failures >= SYMBOL_FAILURE_LIMIT and time.monotonic() - last_failure < SYMBOL_FAILURE_WINDOW:
+        print(f"[DataFetch] Skipping {symbol} options after {failures} consecutive rejections")
+        return None
+    data = _fetch_option_contracts(symbol, underlying_price, min_valid_date)
+    if data is not None and failures:
+        with _symbol_failures_lock:
+            _symbol_failures.pop(symbol, None)
+    return data
+
+def _get_option_contracts(params: dict) -> list:
+    resp = SESSION.get(OPTIONS_CONTRACTS_URL, headers=ALPACA_HEADERS, params=params, timeout=6)
+    resp.raise_for_status()
+    payload = resp.json()
+    return payload.get("option_contracts") or payload.get("data", [])
+
+def _fetch_option_contracts(symbol: str, underlying_price: float,
+                            min_valid_date: date) -> Optional[List[OptionContract]]:
+    # Let the endpoint drop expired, too-near-dated and far-from-the-money contracts,
+    # so the CONTRACTS_LIMIT page holds strikes that can actually be picked.
+    params = {
+        "underlying_symbols": symbol,
+        "status": "active",
+        "expiration_date_gte": min_valid_date.isoformat(),
+        "strike_price_gte": f"{underlying_price * (1 - OPTION_STRIKE_BAND):.2f}",
+        "strike_price_lte": f"{underlying_price * (1 + OPTION_STRIKE_BAND):.2f}",
+        "limit": CONTRACTS_LIMIT,
+    }
+    try:
+        raw = safe_api_call(_get_option_contracts, params)
+    except Exception as e:
+        print(f"[DataFetch] Failed fetching {symbol} options: {e}")
+        # Only a rejected request says something about this symbol; overloads and open
+        # circuits are endpoint-wide and left to the breaker.
+        if _http_status(e) in NON_RETRYABLE_STATUS:
+            with _symbol_failures_lock:
+                failures = _symbol_failures.get(symbol, (0, 0.0))[0]
+                _symbol_failures[symbol] = (failures + 1, time.monotonic())
+        return None
+    # Normalize once at ingestion, so selection only reads plain attributes.
+    contracts = []
+    for c in raw:
         try:
-            resp = requests.get(BASE_URL_OPTS, headers=headers, params=params, timeout=6)
-            resp.raise_for_status()
-            data = resp.json().get("data", [])
-            return data
-        except Exception as e:
-            print(f"[Retry {attempt}/{MAX_RETRIES}] Failed fetching {symbol} options: {e}")
-            if attempt == MAX_RETRIES:
-                return None
-            time.sleep(sleep)
-            sleep *= 2
-    return None
-
-def choose_atm_call_put(symbol: str):
+            n = _normalize(c)
+        except (TypeError, ValueError):
+            continue
+        if n is not None:
+            contracts.append(n)
+    return contracts
+
+def choose_atm_call_put(symbol: str, underlying_price: float, min_valid_date: date):
     try:
-        contracts = fetch_option_contracts_with_backoff(symbol)
+        contracts = fetch_option_contracts_with_backoff(symbol, underlying_price, min_valid_date)
         if not contracts:
             return None, None, None
 
-        bars = fetch_bars_with_backoff(symbol, TimeFrame.Day, limit=1)
-        if bars is None or getattr(bars, "empty", False):
-            return None, None, None
-
-        underlying_price = float(bars["close"].iloc[-1])
-        today = datetime.now(timezone.utc).date()
-        valid_contracts = []
-
-        for c in contracts:
-            try:
-                exp_date_str = c.get("expiration_date")
-                if not exp_date_str:
-                    continue
-                exp_date = datetime.strptime(exp_date_str, "%Y-%m-%d").date()
-                if (exp_date - today).days < MIN_DAYS_TO_EXPIRY:
-                    continue
+        # Filter and pick the nearest-strike call/put in a single pass over the chain.
+        best_call, best_put = None, None
+        best_call_dist = best_put_dist = float("inf")
 
-                vol = int(c.get("volume") or 0)
-                last_price = float(c.get("last_trade_price") or c.get("ask_price") or 0)
-                if last_price < MIN_OPTION_PRICE or vol < MIN_OPTION_VOLUME:
-                    continue
-                valid_contracts.append(c)
-            except Exception:
+        for n in contracts:
+            # Volume rejects most of an illiquid chain, so test it first.
+            if n.volume < MIN_OPTION_VOLUME or n.exp_date < min_valid_date or n.last_price < MIN_OPTION_PRICE:
                 continue
 
-        if not valid_contracts:
-            return None, None, underlying_price
-
-        calls = [c for c in valid_contracts if c.get("option_type", "").lower() == "call"]
-        puts  = [c for c in valid_contracts if c.get("option_type", "").lower() == "put"]
+            dist = abs(n.strike - underlying_price)
+            if n.option_type == "call":
+                if dist < best_call_dist:
+                    best_call, best_call_dist = n, dist
+            elif n.option_type == "put":
+                if dist < best_put_dist:
+                    best_put, best_put_dist = n, dist
 
-        if not calls or not puts:
+        if best_call is None or best_put is None:
             return None, None, underlying_price
 
-        atm_call = min(calls, key=lambda x: abs(float(x.get("strike_price", 0)) - underlying_price))
-        atm_put  = min(puts,  key=lambda x: abs(float(x.get("strike_price", 0)) - underlying_price))
-
-        return atm_call, atm_put, underlying_price
+        return best_call, best_put, underlying_price
     except Exception as e:
         print(f"[OptionSelectError] {symbol}: {e}")
         return None, None, None
@@ -191,27 +635,66 @@ def choose_atm_call_put(symbol: str):
 # -------------------------
 # ORDER SUBMISSION
 # -------------------------
-def submit_option_order(contract: dict, max_invest: float, purchased_options: set, side: str):
+def submit_option_order(contract: OptionContract, max_invest: float, side: str, cycle_id: str):
+    symbol = contract.symbol
     try:
-        symbol = contract.get("symbol")
-        last_price = float(contract.get("ask_price") or contract.get("last_trade_price") or 0)
-        if not symbol or last_price <= 0:
-            print(f"[OrderSkip] Invalid symbol or price: {symbol}, {last_price}")
+        last_price = contract.order_price
+        if last_price <= 0:
+            print(f"[OrderSkip] Invalid price for {symbol}: {last_price}")
             return
 
         qty = int(max_invest / (last_price * 100))
-        if qty < 1 or symbol in purchased_options:
+        if qty < 1 or not claim_purchase(symbol):
             return
 
-        safe_api_call(
-            api.submit_order,
-            symbol=symbol,
-            qty=qty,
-            side=side,
-            type="market",
-            time_in_force="day"
-        )
-        purchased_options.add(symbol)
+        cost = qty * last_price * 100
+        if not reserve_cash(cost):
+            release_purchase(symbol)
+            print(f"[OrderSkip] {symbol}: ${cost:.2f} exceeds remaining cash ${_cash_budget['remaining']:.2f}")
+            return
+        # safe_api_call retries on 5xx and dropped connections, which can land after Alpaca
+        # already accepted the order. A fixed client_order_id turns such a retry into a
+        # duplicate rejection instead of a second order. Every attempt's error is kept, since
+        # the last one alone can't tell whether an earlier attempt went through.
+        attempt_errors = []
+
+        def submit_order(**kwargs):
+            try:
+                return api.submit_order(**kwargs)
+            except Exception as e:
+                attempt_errors.append(e)
+                raise
+
+        try:
+            safe_api_call(
+                submit_order,
+                symbol=symbol,
+                qty=qty,
+                side=side,
+                type="market",
+                time_in_force="day",
+                client_order_id=f"{symbol}-{cycle_id}"
+            )
+        except Exception as e:
+            if _http_status(e) == 422 and "must be unique" in str(e).lower():
+                print(f"[Order] {symbol}: already accepted on an earlier attempt")
+            elif any(_outcome_unknown(err) for err in attempt_errors):
+                # Some attempt may have been accepted; hold the claim and the cash rather than
+                # risk buying it twice. It stays claimed until restart, when the positions
+                # sync re-adds it only if it actually filled.
+                print(f"[OrderUnknown] {symbol}: {e}")
+                send_critical_alert(f"Order outcome unknown for {symbol}", e)
+                return
+            else:
+                # Every attempt was rejected, or none was sent because the circuit is open:
+                # nothing was placed, so the contract stays eligible.
+                release_cash(cost)
+                release_purchase(symbol)
+                if isinstance(e, CircuitOpenError):
+                    print(f"[OrderSkip] {symbol}: {e}")
+                    return
+                raise
+        record_purchase(symbol)
         action = "🟢 Bought" if side == "buy" else "🔴 Sold"
         msg = f"{action} {symbol} x{qty} @ ~${last_price:.2f}"
         print(f"[TRADE] {msg}")
@@ -234,15 +717,38 @@ def trade_logic():
             print("[TradeLogic] No cash.")
             return
         max_invest = cash * RISK_PER_TRADE
+        cycle_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        _cash_budget["remaining"] = cash
+
+        # One positions snapshot per cycle keeps held contracts from being bought again,
+        # even if they were opened outside this process since startup.
+        sync_held_options("TradeLogic")
 
+        min_valid_date = datetime.now(timezone.utc).date() + timedelta(days=MIN_DAYS_TO_EXPIRY)
+
+        closes = fetch_latest_closes(HARDCODED_TICKERS)
         for sym in HARDCODED_TICKERS:
-            call, put, underlying_price = choose_atm_call_put(sym)
-            if not call or not put:
-                print(f"[{sym}] No valid ATM options meeting filters.")
-                continue
+            if sym not in closes:
+                print(f"[{sym}] No recent daily bar; skipping.")
+
+        # Option-chain discovery and order placement are both network-bound. Scan the
+        # universe concurrently and hand each pair of legs to a smaller, bounded order
+        # pool as soon as its chain resolves.
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as scan_ex, \
+                ThreadPoolExecutor(max_workers=ORDER_WORKERS) as order_ex:
+            futures = {
+                scan_ex.submit(choose_atm_call_put, sym, px, min_valid_date): sym
+                for sym, px in closes.items()
+            }
+            for fut in as_completed(futures):
+                sym = futures[fut]
+                call, put, underlying_price = fut.result()
+                if not call or not put:
+                    print(f"[{sym}] No valid ATM options meeting filters.")
+                    continue
 
-            submit_option_order(call, max_invest, purchased_options, side="buy")
-            submit_option_order(put,  max_invest, purchased_options, side="buy")
+                order_ex.submit(submit_option_order, call, max_invest, "buy", cycle_id)
+                order_ex.submit(submit_option_order, put,  max_invest, "buy", cycle_id)
 
     except Exception as e:
         print(f"[TradeLogicError] {e}")
@@ -256,12 +762,15 @@ def manage_risk():
         print("[MarketClosed] Skipping risk management")
         return
     try:
-        positions = safe_api_call(api.list_positions)
+        positions = get_positions_cached()
     except Exception as e:
         print(f"[ManageRisk] Failed to list positions: {e}")
         send_critical_alert("Failed to list positions", e)
         return
 
+    # Evaluate every position first, then send the stop-outs together on the order pool
+    # so several positions tripping at once don't queue behind each other's round-trip.
+    to_sell = []
     for pos in positions:
         try:
             if getattr(pos, "asset_class", "") != "option":
@@ -273,25 +782,40 @@ def manage_risk():
             loss_pct = (entry_price - current_price) / entry_price
 
             if loss_pct >= STOP_LOSS_PCT:
-                safe_api_call(
-                    api.submit_order,
-                    symbol=symbol,
-                    qty=qty,
-                    side="sell",
-                    type="market",
-                    time_in_force="day"
-                )
-                print(f"[STOP-LOSS] Sold {symbol} at {current_price:.2f} (loss {loss_pct*100:.1f}%)")
-                send_discord_message(
-                    f"⚠️ STOP-LOSS triggered: Sold {symbol} x{qty} at ${current_price:.2f} "
-                    f"(loss {loss_pct*100:.1f}%)"
-                )
+                to_sell.append((symbol, qty, current_price, loss_pct))
             else:
                 print(f"[Risk] {symbol} is safe: current {current_price:.2f}, entry {entry_price:.2f}")
 
         except Exception as e:
             print(f"[RiskError] {pos.symbol}: {e}")
 
+    if to_sell:
+        with ThreadPoolExecutor(max_workers=ORDER_WORKERS) as order_ex:
+            for args in to_sell:
+                order_ex.submit(_stop_out, *args)
+
+def _stop_out(symbol: str, qty: int, current_price: float, loss_pct: float) -> None:
+    try:
+        # Stop-loss sells get their own circuit, so a throttled buy burst can't block them.
+        safe_api_call(
+            api.submit_order,
+            circuit="submit_order:sell",
+            symbol=symbol,
+            qty=qty,
+            side="sell",
+            type="market",
+            time_in_force="day"
+        )
+        _positions_cache["until"] = 0.0
+        print(f"[STOP-LOSS] Sold {symbol} at {current_price:.2f} (loss {loss_pct*100:.1f}%)")
+        send_discord_message(
+            f"⚠️ STOP-LOSS triggered: Sold {symbol} x{qty} at ${current_price:.2f} "
+            f"(loss {loss_pct*100:.1f}%)"
+        )
+    except Exception as e:
+        print(f"[RiskError] {symbol}: {e}")
+        send_critical_alert(f"Stop-loss sell failed for {symbol} (loss {loss_pct*100:.1f}%)", e)
+
 # -------------------------
 # HEARTBEAT
 # -------------------------
@@ -303,21 +827,32 @@ def send_heartbeat():
 # -------------------------
 # SCHEDULER
 # -------------------------
-schedule.every(TRADE_INTERVAL_MINUTES).minutes.do(trade_logic)
-schedule.every(TRADE_INTERVAL_MINUTES).minutes.do(manage_risk)
-schedule.every(TRADE_INTERVAL_MINUTES).minutes.do(send_heartbeat)
+def register_jobs():
+    # Tagged and cleared first, so calling this again replaces the jobs instead of stacking
+    # duplicates that would each trade and each hit the API.
+    schedule.clear("bot")
+    schedule.every(TRADE_INTERVAL_MINUTES).minutes.do(trade_logic).tag("bot")
+    # Stop-loss checks are one list_positions call, so they run more often than the scan.
+    schedule.every(RISK_INTERVAL_MINUTES).minutes.do(manage_risk).tag("bot")
+    schedule.every(TRADE_INTERVAL_MINUTES).minutes.do(send_heartbeat).tag("bot")
 
 def run_scheduler():
     print(f"🚀 Dynamic Options Swing (Alpaca) started {datetime.now(timezone.utc)}")
+    register_jobs()
+    load_purchased_options()
     trade_logic()
     manage_risk()
     send_heartbeat()
     while True:
         try:
             schedule.run_pending()
-            time.sleep(30)
+            # Sleep until the next job is due rather than polling on a fixed interval, but
+            # wake at least every SCHEDULER_MAX_SLEEP so clock jumps are noticed.
+            idle = schedule.idle_seconds()
+            time.sleep(min(max(idle, 0), SCHEDULER_MAX_SLEEP) if idle is not None else SCHEDULER_MAX_SLEEP)
         except KeyboardInterrupt:
             print("[Shutdown] Exiting cleanly...")
+            flush_notifications()
             sys.exit(0)
         except Exception as e:
             print(f"[SchedulerError] {e}")